@@ -5,11 +5,26 @@ from typing import (
 )
 from pydantic import (
     BaseModel,
+    ConfigDict,
     Field,
 )
+from pydantic.dataclasses import dataclass
 
 
-class MessageEntity(BaseModel):
+class ExportModel(BaseModel):
+    """
+    エクスポートデータの各オブジェクトの基底クラスです。
+    エクスポートには実際に使われないオブジェクトも多く含まれるため、
+    検証スキーマの構築はインポート時ではなく、初めて検証する時まで遅延させます。
+    """
+
+    model_config = ConfigDict(defer_build=True)
+
+
+# 長いリストで大量に生成される小さなオブジェクト(MessageEntity, Location, PollAnswer, StickerPack, Ip)は、
+# ExportModelを継承せず、インスタンスごとの`__dict__`を持たない`__slots__`付きのpydantic dataclassとして定義する
+@dataclass(slots=True)
+class MessageEntity:
     """
     Telegramのテキストメッセージ内の特殊なエンティティを表すオブジェクトです。
     これには、ハッシュタグ、ユーザー名、URL、テキストの書式設定（太字、斜体など）などが含まれます。
@@ -30,7 +45,8 @@ class MessageEntity(BaseModel):
     )
 
 
-class Location(BaseModel):
+@dataclass(slots=True)
+class Location:
     """
     共有された位置情報メッセージにおける、地図上の特定の地点を表すオブジェクトです。
     """
@@ -41,7 +57,7 @@ class Location(BaseModel):
     )
 
 
-class Invoice(BaseModel):
+class Invoice(ExportModel):
     """
     Telegram上での取引に関連する請求書の基本情報を含むオブジェクトです。
     """
@@ -64,7 +80,8 @@ class Invoice(BaseModel):
     )
 
 
-class PollAnswer(BaseModel):
+@dataclass(slots=True)
+class PollAnswer:
     """
     Telegramの投票における特定の回答オプションを表すオブジェクトです。
     """
@@ -80,7 +97,7 @@ class PollAnswer(BaseModel):
     )
 
 
-class Poll(BaseModel):
+class Poll(ExportModel):
     """
     Telegramの投票（アンケート）を表すオブジェクトです。
     """
@@ -100,7 +117,7 @@ class Poll(BaseModel):
     )
 
 
-class Giveaway(BaseModel):
+class Giveaway(ExportModel):
     """
     Telegramのプレゼント企画（ギブアウェイ）に関する情報を含むオブジェクトです。
     """
@@ -122,7 +139,7 @@ class Giveaway(BaseModel):
     )
 
 
-class Contact(BaseModel):
+class Contact(ExportModel):
     """
     電話帳の連絡先を表すオブジェクトです。
     """
@@ -140,7 +157,7 @@ class Contact(BaseModel):
     )
 
 
-class FrequentContact(BaseModel):
+class FrequentContact(ExportModel):
     """
     ユーザーが頻繁にメッセージを送る可能性が高い連絡先（ユーザーまたはボット）を表すオブジェクトです。
     Telegramはこのデータを使用して、検索セクションの上部にある「People」ボックスや、アタッチメントメニューのボット候補を生成します。
@@ -175,7 +192,7 @@ class FrequentContact(BaseModel):
     )
 
 
-class Session(BaseModel):
+class Session(ExportModel):
     """
     Telegramの特定のアクティブなセッションを表すオブジェクトです。
     「設定 > プライバシーとセキュリティ > アクティブなセッション」に表示される詳細情報を含みます。
@@ -228,7 +245,7 @@ class Session(BaseModel):
     )
 
 
-class WebSession(BaseModel):
+class WebSession(ExportModel):
     """
     Telegramを介した認証を使用してログインしたWebサイトのセッションを表すオブジェクトです。
     この情報は「設定 > プライバシーとセキュリティ > アクティブなセッション」にも表示されます。
@@ -273,7 +290,8 @@ class WebSession(BaseModel):
     )
 
 
-class StickerPack(BaseModel):
+@dataclass(slots=True)
+class StickerPack:
     """
     Telegramのステッカーパックを表すオブジェクトです。
     現在のバージョンのスキーマでは、ステッカーパックのURLのみを保持します。
@@ -282,7 +300,7 @@ class StickerPack(BaseModel):
     url: str = Field(..., description="このステッカーパックのURLです。")
 
 
-class CloudDraft(BaseModel):
+class CloudDraft(ExportModel):
     """
     「クラウドドラフト」とは、ユーザーがTelegramチャットの入力フィールドに残したが、
     まだ送信していないメッセージを指します。
@@ -308,7 +326,8 @@ class CloudDraft(BaseModel):
     )
 
 
-class Ip(BaseModel):
+@dataclass(slots=True)
+class Ip:
     """
     ユーザーがTelegramにアクセスしたIPアドレスを表すオブジェクトです。
     """
@@ -316,7 +335,7 @@ class Ip(BaseModel):
     ip: str = Field(..., description="IPアドレスの文字列です。")
 
 
-class ChangeEvent(BaseModel):
+class ChangeEvent(ExportModel):
     """
     ユーザーに関連する変更イベント（例: ユーザー名、名前、パスワード、電話番号の変更など）を表すオブジェクトです。
     """
@@ -380,7 +399,7 @@ class ChangeEvent(BaseModel):
     )
 
 
-class UserProfilePhoto(BaseModel):
+class UserProfilePhoto(ExportModel):
     """
     ユーザーのプロフィール写真の記録を表すオブジェクトです。
     """
@@ -399,7 +418,7 @@ class UserProfilePhoto(BaseModel):
     )
 
 
-class Story(BaseModel):
+class Story(ExportModel):
     """
     ユーザーがTelegramモバイルアプリから投稿したストーリーを表すオブジェクトです。
     """
@@ -433,7 +452,7 @@ class Story(BaseModel):
 # --- これらのオブジェクトをリストとして含むオブジェクト、または他のオブジェクトの一部となるオブジェクト ---
 
 
-class PersonalInformation(BaseModel):
+class PersonalInformation(ExportModel):
     """
     エクスポートされたユーザーに関する基本的な個人情報を含むオブジェクトです。
     """
@@ -460,7 +479,7 @@ class PersonalInformation(BaseModel):
     )
 
 
-class Contacts(BaseModel):
+class Contacts(ExportModel):
     """
     このエクスポートに含まれるすべての連絡先を含むオブジェクトです。
     ユーザーがアクセスを許可した場合、連絡先はTelegramと継続的に同期されます。
@@ -475,7 +494,7 @@ class Contacts(BaseModel):
     )
 
 
-class FrequentContacts(BaseModel):
+class FrequentContacts(ExportModel):
     """
     ユーザーが頻繁にメッセージを送る可能性が高い連絡先を含むオブジェクトです。
     Telegramは、このデータを使用して検索セクションの上部にある「People」ボックスを生成したり、
@@ -492,7 +511,7 @@ class FrequentContacts(BaseModel):
     )
 
 
-class Sessions(BaseModel):
+class Sessions(ExportModel):
     """
     ユーザーのすべてのアクティブなTelegramセッションに関する情報を含むオブジェクトです。
     これは「設定 > プライバシーとセキュリティ > アクティブなセッション」に表示される情報と一致します。
@@ -507,7 +526,7 @@ class Sessions(BaseModel):
     )
 
 
-class WebSessions(BaseModel):
+class WebSessions(ExportModel):
     """
     Telegramを介した認証を使用してログインしたすべてのWebサイトに関する情報を含むオブジェクトです。
     この情報も「設定 > プライバシーとセキュリティ > アクティブなセッション」に表示されます。
@@ -522,7 +541,7 @@ class WebSessions(BaseModel):
     )
 
 
-class OtherData(BaseModel):
+class OtherData(ExportModel):
     """
     ユーザーのIPアドレス履歴、ユーザー名や電話番号の変更履歴、作成・インストールしたステッカーパック、
     クラウドドラフトなど、その他の様々なデータを含むオブジェクトです。
@@ -562,7 +581,7 @@ class OtherData(BaseModel):
 # --- チャットとメッセージ関連のオブジェクト (これらは他のオブジェクトを参照するため、上位に配置) ---
 
 
-class Message(BaseModel):
+class Message(ExportModel):
     """
     個々のメッセージを表すオブジェクトです。
     このオブジェクトは非常に多くのフィールドを持つため、注意深く確認してください。
@@ -586,9 +605,12 @@ class Message(BaseModel):
         ...,
         description="メッセージが送信された日時です (ISO 8601タイムスタンプ形式、例: 2023-09-03T17:05:43)。",
     )
-    date_unixtime: str = Field(
+    date_unixtime: int = Field(
         ...,
-        description="メッセージが送信された日時です (Unixタイムスタンプ形式、例: 1693753543)。",
+        description="""
+        メッセージが送信された日時です (Unixタイムスタンプ形式、例: 1693753543)。
+        エクスポートでは数字の文字列ですが、並べ替えや比較に使うため読み込み時に整数へ変換します。
+    """,
     )
     from_sender: Optional[str] = Field(
         None,
@@ -953,7 +975,7 @@ class Message(BaseModel):
     )
 
 
-class Chat(BaseModel):
+class Chat(ExportModel):
     """
     個々のチャット（会話）を表すオブジェクトです。
     公開グループやチャンネルのエクスポートでは、エクスポートをリクエストしたユーザーが送信したメッセージのみが含まれることに注意してください。
@@ -981,7 +1003,7 @@ class Chat(BaseModel):
     )
 
 
-class Chats(BaseModel):
+class Chats(ExportModel):
     """
     エクスポートに含まれるすべてのチャットのリストを含むオブジェクトです。
     """
@@ -994,7 +1016,7 @@ class Chats(BaseModel):
     )
 
 
-class LeftChats(BaseModel):
+class LeftChats(ExportModel):
     """
     ユーザーが退出した、またはBANされたスーパーグループとチャンネルのリストを含むオブジェクトです。
     """
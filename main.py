@@ -1,130 +1,240 @@
-import asyncio
-import json
+import argparse
 import csv
-from typing import List
-from collections.abc import AsyncGenerator
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from operator import attrgetter
+from typing import List, Tuple
+from collections.abc import Iterable, Iterator
+
+import ijson
 
 from data_models import Chat, Message
 
 TTL_REPLY = 1  # replies
 TTL_SECONDS = 60 * 60 * 12  # hours
 RESULT_JSON_FILE = "result.json"
+OUTPUT_CSV_FILE = "output.csv"
 MAX_CONTEXT_MESSAGE = 10  # user sends + 1 model answers
+OUTPUT_BUFFER_SIZE = 1 << 20  # bytes
 
+_get_text = attrgetter("text")
 
-async def get_sorted_messages(chat: Chat) -> List[Message]:
-    return sorted(chat.messages, key=lambda x: int(x.date_unixtime))
 
-
-async def get_text_messages(chat: Chat) -> List[Message]:
-    messages = [
-        message
-        for message in chat.messages
-        if message.media_type is None
-        and message.photo is None
-        and message.text_entities != []
-    ]
-    return messages
+def sort_messages(chat: Chat) -> None:
+    chat.messages.sort(key=attrgetter("date_unixtime"))
 
 
-async def get_index_of_model_chat(chat: Chat) -> List[int]:
-    return [
-        i
-        for i, message in enumerate(chat.messages)
-        if message.from_id == "user" + str(chat.id)
-    ]
+def get_text_messages_and_model_index(
+    chat: Chat, model_id: str
+) -> Tuple[List[Message], List[int]]:
+    # テキストメッセージの抽出とモデルのメッセージの位置の記録を、1回の走査で同時に行う
+    messages = []
+    model_index = []
+    for message in chat.messages:
+        if (
+            message.media_type is None
+            and message.photo is None
+            and message.text_entities
+        ):
+            if message.from_id == model_id:
+                model_index.append(len(messages))
+            messages.append(message)
+    return messages, model_index
 
 
-async def recurse_messsages(
-    chat: Chat, model_index: List[int]
-) -> AsyncGenerator[List[Message], None]:  # AsyncGenerator[YieldType, SendType]
+def get_context_ranges(
+    times: array, senders: array, model_index: List[int]
+) -> List[Tuple[int, int]]:
+    # 整数の配列だけを扱い、各contextの先頭と末尾(回答)の位置を返す
     # model_messageごとにcontextが作成される
-    consumed_message_id = []
+    # 後の回答から遡って作成し、最後にチャットの時系列順に並べ替えて返す
+    ranges = []
+    # この位置以降のメッセージは、すでにいずれかのcontextに含まれている
+    consumed = len(times)
     for idx in reversed(model_index):
-        message = chat.messages[idx]  # answer
-        if message.id in consumed_message_id:
+        if idx >= consumed:
             # すでに評価済みのmodel_messageはとばす。
             continue
-        consumed_message_id.append(message.id)
-        context = [
-            message,
-        ]
-        answer_date_unixtime = int(message.date_unixtime)  # UNIX EPOCH (seconds)
-        i = 1
+        # 回答よりもかなり前のメッセージ、最大メッセージ保有数を超えるメッセージはcontextに含めない
+        lower = max(
+            bisect_left(times, times[idx] - TTL_SECONDS),
+            idx - MAX_CONTEXT_MESSAGE + 1,
+        )
+        # contextは回答から遡った連続するメッセージなので、その先頭の位置だけを求める
+        start = idx
+        sender = senders[idx]
         is_turned = False
-        while len(context) < MAX_CONTEXT_MESSAGE:
-            # コンテキストが最大メッセージ保有数に達するまでループ
-            next_idx = idx - i
-            if next_idx <= 0:
-                # チャットの最初のメッセージに到達した場合、次のメッセージを取得できないのでcontextは終了
-                break
-            next_message = chat.messages[next_idx]
-            if answer_date_unixtime - int(next_message.date_unixtime) > TTL_SECONDS:
-                # 直前のメッセージが回答よりもかなり前のメッセージの場合、contextは終了
-                break
-            if next_message.from_id == message.from_id:
-                # 直前のメッセージと送信元IDが同じ場合、連続したメッセージとして纏めるためにcontextに連結
-                context.append(next_message)
-                consumed_message_id.append(next_message.id)
-            else:
+        for next_idx in range(idx - 1, lower - 1, -1):
+            if senders[next_idx] != sender:
                 # 直前のメッセージと送信元IDが異なる場合
                 if is_turned:
                     # ターンが終わったコンテキストなので終了
                     break
                 # ターンがまだ変わっていないコンテキストはターンを切り替え、次のメッセージへ
-                context.append(next_message)
-                consumed_message_id.append(next_message.id)
                 is_turned = True
-            message = next_message
-            i = i + 1
-        yield context
+                sender = senders[next_idx]
+            # 直前のメッセージをcontextに連結（送信元IDが同じ場合は、連続したメッセージとして纏める）
+            start = next_idx
+        ranges.append((start, idx))
+        consumed = start
+    ranges.reverse()
+    return ranges
+
+
+def recurse_messsages(chat: Chat, model_index: List[int]) -> List[List[Message]]:
+    messages = chat.messages
+    # メッセージは送信日時順に並んでいるので、TTLの境界は二分探索で求められる
+    times = array("q", map(attrgetter("date_unixtime"), messages))
+    # 送信元IDは整数の番号に置き換えて比較する
+    sender_codes = {}
+    senders = array(
+        "q",
+        [
+            sender_codes.setdefault(message.from_id, len(sender_codes))
+            for message in messages
+        ],
+    )
+    # 回答から遡る順に並べる
+    return [
+        messages[start : end + 1][::-1]
+        for start, end in get_context_ranges(times, senders, model_index)
+    ]
 
 
-async def merge_context(
-    chat: Chat, contexts: List[List[Message]]
-) -> AsyncGenerator[List[List[str]], None]:
-    model_id = "user" + str(chat.id)
+def merge_context(
+    contexts: Iterable[List[Message]], model_id: str
+) -> Iterator[List[str]]:
     for context in contexts:
-        q = ""
-        a = ""
-        for msg in [message for message in context if message.from_id != model_id]:
-            q += await get_textized_text_entities(msg)
-        for msg in [message for message in context if message.from_id == model_id]:
-            a += await get_textized_text_entities(msg)
-        yield [q, a]
-
-
-async def get_textized_text_entities(message: Message):
-    return "\n".join([text_entity.text for text_entity in message.text_entities])
-
-
-async def main(file_name: str) -> None:
-    with open(file_name, "r", encoding="utf-8") as f:
-        export_data = json.load(f)
-    chat = Chat.model_validate(export_data)
+        q = []
+        a = []
+        # 送信元IDの判定はメッセージごとに1回だけ行い、質問と回答に振り分ける
+        for msg in context:
+            text = "\n".join(map(_get_text, msg.text_entities))
+            if msg.from_id == model_id:
+                a.append(text)
+            else:
+                q.append(text)
+        yield ["".join(q), "".join(a)]
+
+
+def stream_text_chat(file_name: str) -> Tuple[Chat, int]:
+    # メッセージを1件ずつ読み込み、テキストメッセージだけをモデルに変換して保持する
+    # エクスポート全体をメモリに展開しないため、巨大なエクスポートでもメモリ使用量を抑えられる
+    with open(file_name, "rb") as f:
+        meta = {}
+        for prefix, _, value in ijson.parse(f):
+            # 値を組み立てずにイベントだけを読むので、messagesが先に出力されていてもメモリに展開されない
+            # id, name, typeは通常messagesより前に出力されるので、揃った時点で打ち切る
+            if prefix in ("id", "name", "type"):
+                meta[prefix] = value
+                if len(meta) == 3:
+                    break
+        f.seek(0)
+        total = 0
+        messages = []
+        for message in ijson.items(f, "messages.item", use_float=True):
+            total += 1
+            if (
+                message.get("media_type") is None
+                and message.get("photo") is None
+                and message.get("text_entities")
+            ):
+                # 種類の少ない文字列はメッセージ間で同じオブジェクトを共有させ、メモリ使用量を抑える
+                # (一括読み込みではpydantic-coreの文字列キャッシュが同じ役割を果たす)
+                for key in ("type", "from", "from_id"):
+                    if message.get(key) is not None:
+                        message[key] = sys.intern(message[key])
+                messages.append(Message.model_validate(message))
+    return Chat(**meta, messages=messages), total
+
+
+def get_output_file(file_name: str) -> str:
+    # エクスポートごとにresult.jsonと同じディレクトリへ出力する
+    return os.path.join(os.path.dirname(file_name), OUTPUT_CSV_FILE)
+
+
+def main(file_name: str, stream: bool = False) -> None:
+    if stream:
+        chat, total = stream_text_chat(file_name)
+    else:
+        with open(file_name, "rb") as f:
+            # dictを経由せず、pydantic-coreのJSONパーサーで直接モデルに変換する
+            chat = Chat.model_validate_json(f.read())
+        total = len(chat.messages)
     print(
-        f"Total Messages: {len(chat.messages)}",
+        f"{file_name}: Total Messages: {total}",
         flush=True,
     )
-    chat.messages = await get_sorted_messages(chat)
-    chat.messages = await get_text_messages(chat)
-    print(f"Text Messages: {len(chat.messages)}", flush=True)
-    model_index = await get_index_of_model_chat(chat)
-    print(f"Model Messages: {len(model_index)}", flush=True)
-    contexts = reversed(
-        [
-            context
-            async for context in recurse_messsages(chat=chat, model_index=model_index)
-        ]
+    sort_messages(chat)
+    # モデルとなる個人チャットの相手の送信元IDは、ここで1回だけ作成して使い回す
+    model_id = sys.intern(f"user{chat.id}")
+    chat.messages, model_index = get_text_messages_and_model_index(
+        chat=chat, model_id=model_id
     )
-    qa = [qa async for qa in merge_context(chat=chat, contexts=contexts)]
-    with open("output.csv", "w") as f:
+    print(f"{file_name}: Text Messages: {len(chat.messages)}", flush=True)
+    print(f"{file_name}: Model Messages: {len(model_index)}", flush=True)
+    contexts = recurse_messsages(chat=chat, model_index=model_index)
+    # csvモジュールが改行を扱うのでnewline=""で開き、大きめのバッファで書き込みをまとめる
+    with open(
+        get_output_file(file_name),
+        "w",
+        encoding="utf-8",
+        newline="",
+        buffering=OUTPUT_BUFFER_SIZE,
+    ) as f:
         wf = csv.writer(
             f,
         )
         wf.writerow(["question", "answer"])
-        wf.writerows(qa)
+        wf.writerows(merge_context(contexts=contexts, model_id=model_id))
+
+
+def check_output_files(file_names: List[str]) -> None:
+    # 同じディレクトリのエクスポートは出力先のoutput.csvが重なり、互いに上書きしてしまう
+    output_files = [
+        os.path.abspath(get_output_file(file_name)) for file_name in file_names
+    ]
+    if len(set(output_files)) != len(output_files):
+        raise ValueError("同じディレクトリにある複数のresult.jsonは指定できません")
+
+
+def main_many(file_names: List[str], stream: bool = False) -> None:
+    if not file_names:
+        # 処理するエクスポートがない
+        return
+    check_output_files(file_names)
+    # 読み込みも加工もCPU処理なので、エクスポートごとに別プロセスで並列に処理する
+    with ProcessPoolExecutor(
+        max_workers=min(len(file_names), os.cpu_count() or 1)
+    ) as executor:
+        # 結果を取り出して、各プロセスで発生した例外を呼び出し元に伝える
+        list(executor.map(main, file_names, repeat(stream)))
 
 
 if __name__ == "__main__":
-    asyncio.run(main(file_name=RESULT_JSON_FILE))
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "file_names",
+        nargs="*",
+        default=[RESULT_JSON_FILE],
+        help="エクスポートされたresult.jsonのパスです。複数指定すると並列に処理し、それぞれと同じディレクトリにoutput.csvを出力します",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="result.jsonをメッセージ単位で逐次読み込み、メモリ使用量を抑えます",
+    )
+    args = parser.parse_args()
+    # 出力先の重複だけを引数のエラーとして扱い、各エクスポートの処理中の例外はそのまま伝える
+    try:
+        check_output_files(args.file_names)
+    except ValueError as e:
+        parser.error(str(e))
+    if len(args.file_names) == 1:
+        main(file_name=args.file_names[0], stream=args.stream)
+    else:
+        main_many(file_names=args.file_names, stream=args.stream)
@@ -0,0 +1,12 @@
+from setuptools import setup
+from Cython.Build import cythonize
+
+# python setup.py build_ext --inplace でmain.pyとdata_models.pyを拡張モジュールにコンパイルします
+setup(
+    # pyproject.tomlの[project]によるパッケージの自動検出を止め、拡張モジュールだけをビルドする
+    py_modules=[],
+    ext_modules=cythonize(
+        ["data_models.py", "main.py"],
+        language_level=3,
+    ),
+)